@@ -1,8 +1,13 @@
 from aiocache import Cache
-from aiocache.serializers import JsonSerializer
+from aiocache.serializers import NullSerializer
 import os
 
 CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+# Per-entry overrides: URL inputs may point at changing content, while
+# title/abstract-only inputs are effectively static.
+CACHE_TTL_URL = int(os.getenv("CACHE_TTL_URL", "60"))
+CACHE_TTL_STATIC = int(os.getenv("CACHE_TTL_STATIC", "86400"))
 
-# Simple in-memory cache (LRU-like) using aiocache.simple memory backend
-cache = Cache(Cache.MEMORY, ttl=CACHE_TTL, serializer=JsonSerializer())
\ No newline at end of file
+# Simple in-memory cache (LRU-like) using aiocache.simple memory backend.
+# Values live in-process (the worker caches msgpack-encoded results), so store them as-is.
+cache = Cache(Cache.MEMORY, ttl=CACHE_TTL, serializer=NullSerializer())
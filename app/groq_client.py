@@ -1,18 +1,71 @@
 import os
+import time
 import asyncio
+from contextlib import asynccontextmanager
 import httpx
+import orjson
 from typing import List, Dict, Any
 
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 MODEL = os.environ.get("GROQ_MODEL", "llama-3.3-70b-versatile")
+# built once at import and shared by every call
+_HEADERS = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
 
 # semaphore to limit concurrent outgoing LLM requests (protects local CPU & network)
 MAX_INFLIGHT = int(os.getenv("MAX_INFLIGHT", "2"))
 _llm_sem = asyncio.Semaphore(MAX_INFLIGHT)
+# upstream counts as stalled once every slot is busy and the oldest in-flight
+# call has run this long; new LLM work is then rejected instead of piling up
+LLM_STALL_SECONDS = float(os.getenv("LLM_STALL_SECONDS", "30"))
+_llm_waiting = 0
+_llm_started: List[float] = []  # monotonic start time of each in-flight call
+
+
+class UpstreamSaturated(Exception):
+    pass
+
+
+def llm_waiting() -> int:
+    return _llm_waiting
+
+
+def llm_inflight() -> int:
+    return len(_llm_started)
+
+
+def llm_saturated() -> bool:
+    return (
+        len(_llm_started) >= MAX_INFLIGHT
+        and time.monotonic() - min(_llm_started) >= LLM_STALL_SECONDS
+    )
+
+
+@asynccontextmanager
+async def _llm_slot():
+    """
+    Acquire the LLM semaphore, but reject immediately (instead of queueing)
+    while the upstream looks stalled — slow calls then surface as errors
+    rather than piling work up behind them.
+    """
+    global _llm_waiting
+    if llm_saturated():
+        raise UpstreamSaturated("upstream saturated")
+    _llm_waiting += 1
+    try:
+        await _llm_sem.acquire()
+    finally:
+        _llm_waiting -= 1
+    started = time.monotonic()
+    _llm_started.append(started)
+    try:
+        yield
+    finally:
+        _llm_started.remove(started)
+        _llm_sem.release()
 
 async def call_groq_single(client: httpx.AsyncClient, prompt: str, temperature: float = 0.0) -> str:
-    async with _llm_sem:
+    async with _llm_slot():
         payload = {
             "model": MODEL,
             "messages": [
@@ -22,10 +75,9 @@ async def call_groq_single(client: httpx.AsyncClient, prompt: str, temperature:
             "temperature": temperature,
             "max_tokens": 1200
         }
-        headers = {"Authorization": f"Bearer {GROQ_API_KEY}"}
-        r = await client.post(GROQ_API_URL, json=payload, headers=headers, timeout=60.0)
+        r = await client.post(GROQ_API_URL, content=orjson.dumps(payload), headers=_HEADERS, timeout=60.0)
         r.raise_for_status()
-        j = r.json()
+        j = orjson.loads(r.content)
         # openai-compatible response path
         return j["choices"][0]["message"]["content"]
 
@@ -35,7 +87,7 @@ async def call_groq_batch(client: httpx.AsyncClient, prompts: List[str], ids: Li
     We instruct the model to respond with a JSON array whose order matches the order of inputs.
     If the model fails to produce parseable JSON, the caller should handle fallback.
     """
-    async with _llm_sem:
+    async with _llm_slot():
         system_msg = (
             "You are a concise Research Paper Analyzer. You will be given multiple inputs.\n"
             "Produce a single JSON array where each element is an object with keys: id, summary, key_points (array), recommendation."
@@ -46,9 +98,9 @@ async def call_groq_batch(client: httpx.AsyncClient, prompts: List[str], ids: Li
             messages.append({"role": "user", "content": f"ID:{ids[i]}\n{text}"})
 
         payload = {"model": MODEL, "messages": messages, "temperature": 0.0, "max_tokens": 1600}
-        headers = {"Authorization": f"Bearer {GROQ_API_KEY}"}
-        r = await client.post(GROQ_API_URL, json=payload, headers=headers, timeout=120.0)
+        # serialize with orjson rather than letting httpx use stdlib json
+        r = await client.post(GROQ_API_URL, content=orjson.dumps(payload), headers=_HEADERS, timeout=120.0)
         r.raise_for_status()
-        j = r.json()
+        j = orjson.loads(r.content)
         content = j["choices"][0]["message"]["content"]
         return [content]
\ No newline at end of file
@@ -2,24 +2,30 @@
 import os
 import time
 import asyncio
-import hashlib
-from typing import Dict, Any
+from typing import Dict
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import Response
 import httpx
+import blake3
+import msgpack
+import msgspec
 from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from loguru import logger
 
 from .schemas import AnalyzeRequest
 from .utils import make_request_id
-from .cache import cache
+from .store import LRUStore
+from .cache import cache, CACHE_TTL, CACHE_TTL_URL, CACHE_TTL_STATIC
 from .worker import worker_loop
+from .groq_client import MAX_INFLIGHT, llm_inflight, llm_waiting, llm_saturated
 
 # Config (environment)
 MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "20000"))
 WORKER_COUNT = int(os.getenv("WORKER_COUNT", "2"))
 PORT = int(os.getenv("PORT", "8000"))
+# Cap on request records kept in memory; least recently used are evicted first
+MAX_STORE_SIZE = int(os.getenv("MAX_STORE_SIZE", "50000"))
 # Safety: fraction of queue fill to start returning 429
 BACKPRESSURE_THRESHOLD = float(os.getenv("BACKPRESSURE_THRESHOLD", "0.9"))
 
@@ -27,20 +33,45 @@ BACKPRESSURE_THRESHOLD = float(os.getenv("BACKPRESSURE_THRESHOLD", "0.9"))
 REQUESTS_TOTAL = Counter("requests_total", "Total number of incoming analyze requests")
 REQUESTS_QUEUED = Counter("requests_queued", "Requests accepted and placed into the queue")
 REQUESTS_CACHE_HIT = Counter("requests_cache_hit", "Requests served from cache")
+REQUESTS_COALESCED = Counter("requests_coalesced", "Requests attached to an identical in-flight request")
 REQUESTS_ERRORS = Counter("requests_errors", "Requests that resulted in error")
 QSIZE_GAUGE = Gauge("queue_size", "Size of internal queue")
 IN_FLIGHT_GAUGE = Gauge("in_flight_requests", "Currently in-flight processing")
 PROCESS_LATENCY = Histogram("processing_latency_seconds", "Time to process request (worker measured)")
+LLM_WAITING_GAUGE = Gauge("llm_waiting_requests", "LLM calls waiting for a concurrency slot")
+IN_FLIGHT_GAUGE.set_function(llm_inflight)
+LLM_WAITING_GAUGE.set_function(llm_waiting)
 
 app = FastAPI(title="Scalable AI Agent")
 
-# NOTE: store is a simple in-memory dict: request_id -> metadata
+# NOTE: store is a bounded in-memory LRU mapping: request_id -> metadata
 # In production swap to Redis or other durable store (so restarts don't lose state)
-app_state_keys = ("queue", "store", "http_client", "worker_tasks")
+app_state_keys = ("queue", "store", "inflight", "http_client", "worker_tasks")
 
 
-def _hash_text(text: str) -> str:
-    return hashlib.md5(text.encode("utf-8")).hexdigest()
+_analyze_decoder = msgspec.json.Decoder(AnalyzeRequest)
+# the route reads the raw body, so declare it for OpenAPI (/docs) by hand
+_, _analyze_components = msgspec.json.schema_components((AnalyzeRequest,))
+_ANALYZE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": _analyze_components["AnalyzeRequest"]}},
+    }
+}
+
+
+def _hash_text(data: bytes) -> str:
+    # 16-byte BLAKE3 digest (32 hex chars) is plenty for the cache keyspace
+    return blake3.blake3(data).hexdigest(length=16)
+
+
+def _cache_ttl(req: AnalyzeRequest) -> int:
+    # URLs may reference dynamic content; title/abstract-only inputs don't change
+    if req.url:
+        return CACHE_TTL_URL
+    if (req.title or req.abstract) and not req.text:
+        return CACHE_TTL_STATIC
+    return CACHE_TTL
 
 
 @app.on_event("startup")
@@ -52,9 +83,16 @@ async def startup_event():
     # initialize state objects
     logger.info("Starting up: initializing queue, store, http client, and workers")
     app.state.queue = asyncio.Queue(maxsize=MAX_QUEUE_SIZE)
-    app.state.store: Dict[str, Dict[str, Any]] = {}
-    limits = httpx.Limits(max_keepalive_connections=10, max_connections=20)
-    app.state.http_client = httpx.AsyncClient(timeout=120.0, limits=limits)
+    # sampled at scrape time instead of being set on every request
+    QSIZE_GAUGE.set_function(app.state.queue.qsize)
+    app.state.store: LRUStore = LRUStore(MAX_STORE_SIZE)
+    # cache_key -> future resolved by the worker once that content is processed
+    app.state.inflight: Dict[str, asyncio.Future] = {}
+    # size the keep-alive pool to worst-case LLM concurrency so calls never pay a fresh TLS handshake;
+    # HTTP/2 additionally multiplexes concurrent calls over one connection
+    pool = max(20, WORKER_COUNT * MAX_INFLIGHT * 2)
+    limits = httpx.Limits(max_keepalive_connections=pool, max_connections=pool, keepalive_expiry=300.0)
+    app.state.http_client = httpx.AsyncClient(timeout=120.0, limits=limits, http2=True)
     app.state.worker_tasks = []
 
     # create worker coroutines (background)
@@ -77,35 +115,51 @@ async def shutdown_event():
     logger.info("Shutdown complete.")
 
 
-@app.post("/analyze")
-async def analyze(req: AnalyzeRequest):
+@app.post("/analyze", openapi_extra=_ANALYZE_BODY)
+async def analyze(request: Request):
     """
     Accepts a research-paper fragment (title, abstract, text, or URL).
     Returns immediately with a request_id. Worker(s) will process in background.
     """
     REQUESTS_TOTAL.inc()
 
+    try:
+        req = _analyze_decoder.decode(await request.body())
+    except msgspec.ValidationError as e:
+        # keep FastAPI's list-of-errors 422 shape
+        REQUESTS_ERRORS.inc()
+        raise HTTPException(status_code=422, detail=[{"type": "value_error", "loc": ["body"], "msg": str(e)}])
+    except msgspec.DecodeError as e:
+        REQUESTS_ERRORS.inc()
+        raise HTTPException(status_code=422, detail=[{"type": "json_invalid", "loc": ["body"], "msg": str(e)}])
+
     # Build a single text blob for the LLM
-    parts = []
-    if req.title:
-        parts.append(f"Title: {req.title}")
-    if req.abstract:
-        parts.append(f"Abstract: {req.abstract}")
-    if req.text:
-        parts.append(req.text)
-    if req.url:
-        parts.append(f"URL: {req.url}")
-    text_blob = "\n\n".join(parts).strip()
+    if req.text and not (req.title or req.abstract or req.url):
+        # fast path for the common text-only payload: no list/join needed
+        text_blob = req.text.strip()
+    else:
+        parts = []
+        if req.title:
+            parts.append(f"Title: {req.title}")
+        if req.abstract:
+            parts.append(f"Abstract: {req.abstract}")
+        if req.text:
+            parts.append(req.text)
+        if req.url:
+            parts.append(f"URL: {req.url}")
+        text_blob = "\n\n".join(parts).strip()
 
     if not text_blob:
         REQUESTS_ERRORS.inc()
         raise HTTPException(status_code=400, detail="No text provided in request")
 
     # Quick cache check to return immediate result if we've already processed same content
-    cache_key = "analyze:" + _hash_text(text_blob)
+    # encode once; the worker payload keeps the str form
+    blob_bytes = text_blob.encode("utf-8")
+    cache_key = "analyze:" + _hash_text(blob_bytes)
     cached = await cache.get(cache_key)
     if cached is not None:
-        # Create a request_id but mark as done immediately with cached result
+        # Create a request_id but mark as done immediately with cached (msgpack-encoded) result
         rid = make_request_id()
         now = time.time()
         app.state.store[rid] = {
@@ -117,24 +171,36 @@ async def analyze(req: AnalyzeRequest):
         REQUESTS_CACHE_HIT.inc()
         return {"request_id": rid, "status": "done", "cached": True}
 
+    # Identical content already queued/processing: piggyback on it instead of a new LLM call
+    pending = app.state.inflight.get(cache_key)
+    if pending is not None:
+        rid = make_request_id()
+        rec = {"status": "queued", "queued_at": time.time(), "finished_at": None, "result": None}
+        app.state.store[rid] = rec
+        pending.add_done_callback(lambda f: rec.update(f.result()))
+        REQUESTS_COALESCED.inc()
+        return {"request_id": rid, "status": "queued", "coalesced": True}
+
     # Backpressure: check queue occupancy
     q = app.state.queue
     qsize = q.qsize()
-    QSIZE_GAUGE.set(qsize)
     if qsize >= int(MAX_QUEUE_SIZE * BACKPRESSURE_THRESHOLD):
         # Reject to prevent memory exhaustion; clients should retry with backoff
         logger.warning("Queue full ({}). Returning 429.", qsize)
         raise HTTPException(status_code=429, detail="Server overloaded — try again later")
+    if llm_saturated():
+        # Upstream stalled: push back now instead of queueing work nothing can drain
+        logger.warning("LLM upstream saturated. Returning 503.")
+        raise HTTPException(status_code=503, detail="Upstream LLM saturated — try again later")
 
     # Otherwise accept and enqueue
     rid = make_request_id()
     now = time.time()
     app.state.store[rid] = {"status": "queued", "queued_at": now, "finished_at": None, "result": None}
-    # Put a small payload; worker will enrich the state with finished_at/result
-    payload = {"id": rid, "text": text_blob, "submitted_at": now, "cache_key": cache_key}
-    await q.put(payload)
+    app.state.inflight[cache_key] = asyncio.get_running_loop().create_future()
+    # Put a small (id, text, cache_key, ttl) tuple; worker will enrich the state with finished_at/result
+    await q.put((rid, text_blob, cache_key, _cache_ttl(req)))
     REQUESTS_QUEUED.inc()
-    QSIZE_GAUGE.set(q.qsize())
     return {"request_id": rid, "status": "queued"}
 
 
@@ -147,6 +213,10 @@ async def get_result(request_id: str):
     rec = app.state.store.get(request_id)
     if rec is None:
         raise HTTPException(status_code=404, detail="Unknown request_id")
+    app.state.store.touch(request_id)
+    # results are stored msgpack-encoded to keep completed records compact
+    if rec.get("result") is not None:
+        rec = {**rec, "result": msgpack.unpackb(rec["result"])}
     return rec
 
 
@@ -154,7 +224,14 @@ async def get_result(request_id: str):
 async def health():
     qsize = app.state.queue.qsize() if hasattr(app.state, "queue") else 0
     workers = len(getattr(app.state, "worker_tasks", []))
-    return {"status": "ok", "queue_size": qsize, "workers": workers}
+    return {
+        "status": "ok",
+        "queue_size": qsize,
+        "workers": workers,
+        "llm_in_flight": llm_inflight(),
+        "llm_waiting": llm_waiting(),
+        "upstream_saturated": llm_saturated(),
+    }
 
 
 @app.get("/metrics")
@@ -1,7 +1,12 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel
+from typing import Optional, Annotated
+import msgspec
 
-class AnalyzeRequest(BaseModel):
+# http(s) scheme check done inside msgspec's decoder instead of pydantic's HttpUrl
+HttpUrl = Annotated[str, msgspec.Meta(pattern=r"^https?://\S+$")]
+
+class AnalyzeRequest(msgspec.Struct):
+    # msgspec decodes + validates the raw body in one pass (hot path: every /analyze)
     title: Optional[str] = None
     abstract: Optional[str] = None
     text: Optional[str] = None
@@ -0,0 +1,21 @@
+from collections import OrderedDict
+
+
+class LRUStore(OrderedDict):
+    """
+    request_id -> metadata mapping capped at `max_size` entries.
+    Inserting past the cap evicts the least recently used record; call
+    `touch(rid)` on read to mark a record as recently used.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+    def touch(self, key):
+        self.move_to_end(key)
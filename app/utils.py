@@ -1,20 +1,73 @@
-import uuid, re, json
+import os, re, json
+import orjson
+
+# opening bracket of a JSON object/array; compiled once at import
+_JSON_RE = re.compile(r"[\{\[]")
 
 def make_request_id():
-    return uuid.uuid4().hex
+    # 128 random bits as 32 hex chars, without building a uuid.UUID
+    return os.urandom(16).hex()
+
+
+def _loads(s: str):
+    # orjson first (C parser); stdlib json as a more lenient fallback
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        return json.loads(s)
+
+
+def _scan_json_block(s: str, start: int):
+    """
+    Walk forward from the bracket at `start` and return the index just past its
+    matching close bracket, or None if it never balances. Brackets inside JSON
+    strings are ignored. Linear in len(s), no backtracking.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(s)):
+        c = s[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{" or c == "[":
+            depth += 1
+        elif c == "}" or c == "]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
 
 
 def extract_json_from_text(s: str):
     # try direct load
     try:
-        return json.loads(s)
+        return _loads(s)
     except Exception:
         pass
-    # fallback: extract {...} or [ ... ] block
-    m = re.search(r"(\{.*\}|\[.*\])", s, flags=re.DOTALL)
-    if m:
+    # fallback: extract the first balanced {...} or [ ... ] block that parses
+    # to an object or a list of objects (so prose like "input [1]" is skipped).
+    # Each retry resumes after the rejected block, so every character is
+    # scanned at most once and malformed output stays linear-time.
+    m = _JSON_RE.search(s)
+    while m:
+        end = _scan_json_block(s, m.start())
+        if end is None:
+            return None
         try:
-            return json.loads(m.group(1))
+            value = _loads(s[m.start():end])
         except Exception:
-            return None
-    return None
\ No newline at end of file
+            value = None
+        if isinstance(value, dict) or (
+            isinstance(value, list) and value and all(isinstance(o, dict) for o in value)
+        ):
+            return value
+        m = _JSON_RE.search(s, end)
+    return None
@@ -1,63 +1,134 @@
 import os, time, json, asyncio
-from typing import List
+import msgpack
+from typing import List, Optional
 from .groq_client import call_groq_batch, call_groq_single
 from .utils import extract_json_from_text
+from .cache import cache
 
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
 BATCH_TIMEOUT = float(os.getenv("BATCH_TIMEOUT", "0.12"))
 
+
+def _settle(fut: asyncio.Future, outcome):
+    # hand the batch's outcome for this content to requests coalesced onto it
+    if fut.done():
+        return
+    fut.set_result(outcome or {"status": "error", "error": "no result returned for request"})
+
+
+def _shareable(obj):
+    # the LLM echoes the leader's request_id; strip it so cache hits don't report someone else's id
+    if isinstance(obj, dict) and "id" in obj:
+        return {k: v for k, v in obj.items() if k != "id"}
+    return obj
+
+
 async def worker_loop(app, idx: int):
     queue = app.state.queue
     client = app.state.http_client
     store = app.state.store
+    inflight = app.state.inflight
 
     while True:
-        item = await queue.get()
-        # item = {id, text, submitted_at}
-        batch = [item]
+        # item = (id, text, cache_key, ttl); kept as parallel lists (one pass, no per-item dicts)
+        ids: List[str] = []
+        texts: List[str] = []
+        cache_keys: List[str] = []
+        ttls: List[int] = []
+
+        rid, text, cache_key, ttl = await queue.get()
+        ids.append(rid)
+        texts.append(text)
+        cache_keys.append(cache_key)
+        ttls.append(ttl)
         # collect extra items (non-blocking wait up to BATCH_TIMEOUT)
         t0 = time.monotonic()
         try:
-            while len(batch) < BATCH_SIZE:
-                timeout = max(0, BATCH_TIMEOUT - (time.monotonic() - t0))
-                more = await asyncio.wait_for(queue.get(), timeout=timeout)
-                batch.append(more)
+            while len(ids) < BATCH_SIZE:
+                # drain whatever is already queued without a scheduler hop
+                while len(ids) < BATCH_SIZE and not queue.empty():
+                    rid, text, cache_key, ttl = queue.get_nowait()
+                    ids.append(rid)
+                    texts.append(text)
+                    cache_keys.append(cache_key)
+                    ttls.append(ttl)
+                if len(ids) >= BATCH_SIZE:
+                    break
+                timeout = BATCH_TIMEOUT - (time.monotonic() - t0)
+                if timeout <= 0:
+                    break
+                rid, text, cache_key, ttl = await asyncio.wait_for(queue.get(), timeout=timeout)
+                ids.append(rid)
+                texts.append(text)
+                cache_keys.append(cache_key)
+                ttls.append(ttl)
         except asyncio.TimeoutError:
             pass
 
-        ids = [b["id"] for b in batch]
-        texts = [b["text"] for b in batch]
-
         # Call Groq batch
+        # per-item outcome handed to coalesced followers (independent of the bounded store)
+        outcomes: List[Optional[dict]] = [None] * len(ids)
         try:
             responses = await call_groq_batch(client, texts, ids)
             # responses[0] should be a JSON array string — try parse
             parsed = extract_json_from_text(responses[0])
-            if isinstance(parsed, list) and len(parsed) == len(batch):
-                # good: write each result
+            if (
+                isinstance(parsed, list)
+                and len(parsed) == len(ids)
+                and all(isinstance(o, dict) for o in parsed)
+            ):
+                # good: write each result (one wall-clock read for the whole batch)
+                now = time.time()
+                pos = {rid: i for i, rid in enumerate(ids)}
                 for obj in parsed:
                     rid = obj.get("id")
                     if rid and rid in store:
+                        # results are kept msgpack-encoded; /result decodes on read
                         store[rid]["status"] = "done"
-                        store[rid]["result"] = obj
-                        store[rid]["finished_at"] = time.time()
+                        store[rid]["result"] = msgpack.packb(obj)
+                        store[rid]["finished_at"] = now
+                    if rid in pos:
+                        i = pos[rid]
+                        shared = msgpack.packb(_shareable(obj))
+                        outcomes[i] = {"status": "done", "finished_at": now, "result": shared}
+                        # promote into cache so identical submissions skip the LLM
+                        await cache.set(cache_keys[i], shared, ttl=ttls[i])
             else:
                 # fallback: call per-item
-                for i, b in enumerate(batch):
+                for i, rid in enumerate(ids):
+                    # record may have been evicted from the bounded store meanwhile
+                    rec = store.get(rid)
                     try:
-                        out = await call_groq_single(client, b["text"])
+                        out = await call_groq_single(client, texts[i])
                         parsed_single = extract_json_from_text(out)
-                        store[b["id"]]["status"] = "done"
-                        store[b["id"]]["result"] = parsed_single or {"raw": out}
-                        store[b["id"]]["finished_at"] = time.time()
+                        result = parsed_single or {"raw": out}
+                        finished_at = time.time()
+                        packed = msgpack.packb(result)
+                        shareable = _shareable(result)
+                        shared = packed if shareable is result else msgpack.packb(shareable)
+                        outcomes[i] = {"status": "done", "finished_at": finished_at, "result": shared}
+                        if rec is not None:
+                            rec["status"] = "done"
+                            rec["result"] = packed
+                            rec["finished_at"] = finished_at
+                        if parsed_single is not None:
+                            await cache.set(cache_keys[i], shared, ttl=ttls[i])
                     except Exception as e:
-                        store[b["id"]]["status"] = "error"
-                        store[b["id"]]["error"] = str(e)
+                        outcomes[i] = {"status": "error", "error": str(e)}
+                        if rec is not None:
+                            rec["status"] = "error"
+                            rec["error"] = str(e)
         except Exception as e:
             # mark batch items as error (or requeue depending on policy)
-            for b in batch:
-                store[b["id"]]["status"] = "error"
-                store[b["id"]]["error"] = str(e)
+            for i, rid in enumerate(ids):
+                outcomes[i] = {"status": "error", "error": str(e)}
+                rec = store.get(rid)
+                if rec is not None:
+                    rec["status"] = "error"
+                    rec["error"] = str(e)
         finally:
-            for _ in batch:
+            for i in range(len(ids)):
+                fut = inflight.pop(cache_keys[i], None)
+                if fut is not None:
+                    _settle(fut, outcomes[i])
                 queue.task_done()
\ No newline at end of file